@@ -1,96 +1,271 @@
+import argparse
 import configparser
+import contextlib
+import csv
+import dbm
 import math
 import os
+import shelve
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 
-import pandas as pd
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Read configuration
-config = configparser.ConfigParser()
+# Configuration file, read lazily on first use; environment variables take precedence
 config_path = os.path.join(os.path.dirname(__file__), "config.ini")
-config.read(config_path)
+CONFIG_ENV_VARS = {"url": "PLEX_URL", "token": "PLEX_TOKEN", "music_library_id": "PLEX_MUSIC_LIBRARY_ID"}
 
-# Get configuration values
-PLEX_URL = config["plex"]["url"]
-PLEX_TOKEN = config["plex"]["token"]
-MUSIC_LIBRARY_ID = config["plex"]["music_library_id"]
+# Per-request headers, built once rather than on every call
+CONTAINER_HEADERS = {"X-Plex-Container-Size": "2000"}
+
+# Maximum number of concurrent requests sent to the Plex server
+MAX_WORKERS = 16
+
+# Number of concurrent rating updates sent in update mode
+UPDATE_WORKERS = 8
+
+# Columns written to the results CSV
+RESULT_FIELDS = ["Artist", "Album", "Rating", "Status", "Rating Adjustment", "Avg Rating", "Lowest Track", "Highest Track", "Reason"]
+
+# Number of tracks requested per page when bulk-fetching the library
+TRACK_PAGE_SIZE = 1000
+
+# Albums missing from the cache above this count are fetched via the bulk track listing
+BULK_FETCH_THRESHOLD = 50
+
+# On-disk track cache; bump CACHE_VERSION whenever the cached track format changes
+CACHE_FILE = os.path.join(os.path.dirname(__file__), ".plex_cache")
+CACHE_VERSION = 2
+# Errors that disable the cache for the run instead of aborting it
+CACHE_ERRORS = (OSError, *dbm.error)
+
+# Multipliers for round_half_up's common precisions
+_POW10 = (1, 10, 100, 1000)
+
+
+@lru_cache(maxsize=1)
+def _config() -> Dict[str, str]:
+    """Return Plex settings, only reading config.ini for values not set in the environment."""
+    values = {key: os.environ.get(env_var, "") for key, env_var in CONFIG_ENV_VARS.items()}
+    if all(values.values()):
+        return values
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return {key: value or config["plex"][key] for key, value in values.items()}
+
+
+@lru_cache(maxsize=1)
+def _endpoints() -> Dict[str, str]:
+    """Return Plex endpoint URLs, built once from the configuration."""
+    plex_url, library_id = _config()["url"], _config()["music_library_id"]
+    return {
+        "albums": f"{plex_url}/library/sections/{library_id}/albums",
+        "section_all": f"{plex_url}/library/sections/{library_id}/all",
+        "tracks_template": f"{plex_url}/library/metadata/{{}}/children",
+    }
+
+
+@lru_cache(maxsize=1)
+def _session() -> requests.Session:
+    """Return the shared session so every Plex call reuses pooled keep-alive connections."""
+    session = requests.Session()
+    # Throttled requests (429/503) are retried after the server's Retry-After instead of pacing every call
+    retry = Retry(total=5, backoff_factor=0.2, status_forcelist=[429, 503], respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=32, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"X-Plex-Token": _config()["token"], "Accept": "application/json"})
+    return session
+
+
+@dataclass(slots=True, frozen=True)
+class Album:
+    key: str
+    title: str
+    artist: str
+    user_rating: Optional[float]
+    updated_at: Optional[int]
+
+
+@dataclass(slots=True, frozen=True)
+class Track:
+    rating: Optional[float]
+    duration: int  # Seconds
 
 
 # Function to get all albums from Plex
-def get_all_albums() -> List[Dict[str, str]]:
-    url = f"{PLEX_URL}/library/sections/{MUSIC_LIBRARY_ID}/albums"
-    headers = {"X-Plex-Token": PLEX_TOKEN, "Accept": "application/json", "X-Plex-Container-Size": "2000"}
-    response = requests.get(url, headers=headers)
+def get_all_albums() -> List[Album]:
+    response = _session().get(_endpoints()["albums"], headers=CONTAINER_HEADERS)
     albums = []
 
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         if "MediaContainer" in data and "Metadata" in data["MediaContainer"]:
             for album in data["MediaContainer"]["Metadata"]:
-                albums.append({"key": album["ratingKey"], "title": album["title"], "artist": album["parentTitle"], "userRating": album.get("userRating")})
+                albums.append(Album(album["ratingKey"], album["title"], album["parentTitle"], album.get("userRating"), album.get("updatedAt")))
 
     return albums
 
 
 # Function to get tracks for an album
-def get_album_tracks(album_key: str) -> List[Dict[str, Any]]:
-    url = f"{PLEX_URL}/library/metadata/{album_key}/children"
-    headers = {"X-Plex-Token": PLEX_TOKEN, "Accept": "application/json", "X-Plex-Container-Size": "2000"}
-    response = requests.get(url, headers=headers)
+def get_album_tracks(album_key: str) -> List[Track]:
+    response = _session().get(_endpoints()["tracks_template"].format(album_key), headers=CONTAINER_HEADERS)
     tracks = []
 
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         if "MediaContainer" in data and "Metadata" in data["MediaContainer"]:
             for track in data["MediaContainer"]["Metadata"]:
-                user_rating = track.get("userRating", None)
-                duration = track.get("duration", 0)
-                if duration:
-                    duration = int(duration) // 1000  # Convert from milliseconds to seconds
-                tracks.append({"title": track["title"], "rating": user_rating, "duration": duration})
+                tracks.append(parse_track(track))
 
     return tracks
 
 
+# Function to get one page of tracks from the music library
+def get_tracks_page(start: int) -> Dict[str, Any]:
+    headers = {"X-Plex-Container-Start": str(start), "X-Plex-Container-Size": str(TRACK_PAGE_SIZE)}
+    response = _session().get(_endpoints()["section_all"], headers=headers, params={"type": 10})  # Type 10 is for tracks
+    # A missing page would silently drop tracks and skew album ratings, so fail loudly
+    response.raise_for_status()
+    container: Dict[str, Any] = orjson.loads(response.content).get("MediaContainer", {})
+    return container
+
+
+# Function to get all tracks in the music library grouped by album key
+def get_all_tracks() -> Dict[str, List[Track]]:
+    pages = [get_tracks_page(0)]
+    if "totalSize" in pages[0]:
+        # The total is known up front, so the remaining pages can be fetched concurrently
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            pages.extend(executor.map(get_tracks_page, range(TRACK_PAGE_SIZE, int(pages[0]["totalSize"]), TRACK_PAGE_SIZE)))
+    else:
+        # Without a total, keep paging until a short page comes back
+        while len(pages[-1].get("Metadata", [])) == TRACK_PAGE_SIZE:
+            pages.append(get_tracks_page(len(pages) * TRACK_PAGE_SIZE))
+
+    tracks_by_album: Dict[str, List[Track]] = defaultdict(list)
+    for page in pages:
+        for track in page.get("Metadata", []):
+            tracks_by_album[track["parentRatingKey"]].append(parse_track(track))
+
+    return tracks_by_album
+
+
+# Function to open the on-disk track cache, returning None when it cannot be used
+def open_track_cache() -> Optional[shelve.Shelf[Any]]:
+    try:
+        return shelve.open(CACHE_FILE)
+    except CACHE_ERRORS as e:
+        print(f"Track cache unavailable, continuing without it: {e}")
+        return None
+
+
+# Function to get tracks for every unrated album, optionally reusing and storing cached tracks for unchanged albums
+# Returns the tracks by album key and the number of albums served from the cache
+def get_tracks_for_albums(albums: List[Album], use_cache: bool) -> tuple[Dict[str, List[Track]], int]:
+    pending = [album for album in albums if album.user_rating is None]
+    cache = open_track_cache() if use_cache else None
+    tracks_by_album = read_cached_tracks(cache, pending) if cache is not None else {}
+    misses = [album for album in pending if album.key not in tracks_by_album]
+
+    if len(misses) > BULK_FETCH_THRESHOLD:
+        fetched = get_all_tracks()
+    else:
+        keys = [album.key for album in misses]
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            fetched = dict(zip(keys, executor.map(get_album_tracks, keys), strict=True))
+
+    for album in misses:
+        tracks_by_album[album.key] = fetched.get(album.key, [])
+
+    if cache is not None:
+        write_cached_tracks(cache, misses, tracks_by_album)
+    return tracks_by_album, len(pending) - len(misses)
+
+
+# Function to read cached tracks for albums whose updatedAt is unchanged
+def read_cached_tracks(cache: shelve.Shelf[Any], albums: List[Album]) -> Dict[str, List[Track]]:
+    cached = {}
+    try:
+        for album in albums:
+            # Without an updatedAt a cached entry can't be validated, so always refetch
+            if album.updated_at is None:
+                continue
+            entry = cache.get(album.key)
+            if entry is not None and entry[:2] == (CACHE_VERSION, album.updated_at):
+                cached[album.key] = entry[2]
+    except CACHE_ERRORS as e:
+        print(f"Failed to read track cache, fetching all tracks: {e}")
+        return {}
+    return cached
+
+
+# Function to store fetched tracks in the cache and close it
+def write_cached_tracks(cache: shelve.Shelf[Any], albums: List[Album], tracks_by_album: Dict[str, List[Track]]) -> None:
+    try:
+        for album in albums:
+            tracks = tracks_by_album[album.key]
+            # Empty results may be a failed request, and albums without an updatedAt can't be validated later
+            if tracks and album.updated_at is not None:
+                cache[album.key] = (CACHE_VERSION, album.updated_at, tracks)
+    except CACHE_ERRORS as e:
+        print(f"Failed to update track cache: {e}")
+    finally:
+        with contextlib.suppress(*CACHE_ERRORS):
+            cache.close()
+
+
+def parse_track(track: Dict[str, Any]) -> Track:
+    """Convert a Plex track payload into the Track used for rating."""
+    duration = track.get("duration", 0)
+    if duration:
+        duration = int(duration) // 1000  # Convert from milliseconds to seconds
+    return Track(track.get("userRating", None), duration)
+
+
 # Function to calculate album rating based on track ratings
-def calculate_album_rating(tracks: List[Dict[str, Any]]) -> tuple[Optional[int], Optional[str]]:
+def calculate_album_rating(tracks: List[Track]) -> tuple[Optional[int], Optional[str], Optional[tuple[float, float, float]]]:
+    # Returns (rating, skip reason, (avg, lowest, highest) of the filtered tracks)
+    # Albums with identical (rating, duration) sequences share a cached result
+    return _calc_rating_cached(tuple(tracks))
+
+
+@lru_cache(maxsize=4096)
+def _calc_rating_cached(items: tuple[Track, ...]) -> tuple[Optional[int], Optional[str], Optional[tuple[float, float, float]]]:
     # Get basic stats before any filtering
-    ratings = [t["rating"] for t in tracks if t["rating"] is not None]
-    if not ratings:
-        return None, "No rated tracks"
+    rated_count, unrated_count, rating_sum, min_rating = _unfiltered_stats(items)
+    if not rated_count:
+        return None, "No rated tracks", None
 
-    min_rating = min(ratings)
-    avg_rating = sum(ratings) / len(ratings)
+    avg_rating = rating_sum / rated_count
 
     # Skip if any track is unrated
-    unrated_count = sum(1 for track in tracks if track.get("rating") is None or track.get("rating") == 0)
     if unrated_count > 0:
-        return None, f"Has {unrated_count} unrated tracks (min: {min_rating}, avg: {avg_rating:.1f})"
+        return None, f"Has {unrated_count} unrated tracks (min: {min_rating}, avg: {avg_rating:.1f})", None
 
     # Filter out very short tracks with low ratings
-    filtered_tracks = [track for track in tracks if not (track.get("duration", 0) < 60 and track.get("rating", 0) < 3) and not track.get("duration", 0) < 30]
+    count, rating_sum, lowest, highest, tiers = _filtered_stats(items)
 
     # Skip if too few tracks remain after filtering
-    if len(filtered_tracks) < 3:
-        removed_tracks = len(tracks) - len(filtered_tracks)
+    if count < 3:
+        removed_tracks = len(items) - count
         filter_info = f" ({removed_tracks} tracks filtered)" if removed_tracks > 0 else ""
-        return None, f"Too few tracks {len(filtered_tracks)} tracks{filter_info}: (min: {min_rating}, avg: {avg_rating:.1f})"
+        return None, f"Too few tracks {count} tracks{filter_info}: (min: {min_rating}, avg: {avg_rating:.1f})", None
 
-    ratings = [track["rating"] for track in filtered_tracks]
-    min_rating = min(ratings)
-    avg_rating = sum(ratings) / len(ratings)
+    min_rating, max_rating = lowest, highest
+    avg_rating = rating_sum / count
 
     # Calculate percentages for each tier
-    excellent = sum(1 for r in ratings if r >= 9) / len(ratings)
-    very_good = sum(1 for r in ratings if 7 <= r < 9) / len(ratings)
-    # average = sum(1 for r in ratings if r == 6) / len(ratings)
-    below_average = sum(1 for r in ratings if 4 <= r < 6) / len(ratings)
-    poor = sum(1 for r in ratings if r < 4) / len(ratings)
+    excellent, very_good, below_average, poor = (tier_count / count for tier_count in tiers)
 
     # Best track bonus
-    max_rating = max(ratings) if ratings else 0
     best_track_bonus = 0
     if max_rating >= 9:
         best_track_bonus = 0.7
@@ -98,7 +273,6 @@ def calculate_album_rating(tracks: List[Dict[str, Any]]) -> tuple[Optional[int],
         best_track_bonus = 0.3
 
     # Bad track penalty (increased)
-    min_rating = min(ratings) if ratings else 0
     bad_track_penalty = 0
     if min_rating < 4:
         bad_track_penalty = 1.5  # Increased from 1.2
@@ -116,42 +290,81 @@ def calculate_album_rating(tracks: List[Dict[str, Any]]) -> tuple[Optional[int],
 
     # Apply adjustment and round, ensuring result is not lower than minimum track rating
     final_rating = max(min_rating, avg_rating + adjustment)
-    return round_half_up(final_rating), None
+    return round_half_up(final_rating), None, (avg_rating, min_rating, max_rating)
+
+
+def _unfiltered_stats(items: tuple[Track, ...]) -> tuple[int, int, float, Optional[float]]:
+    """Single pass over all tracks. Returns (rated count, unrated count, rating sum, lowest rating)."""
+    rated_count = unrated_count = 0
+    rating_sum = 0.0
+    min_rating = None
+    for track in items:
+        rating = track.rating
+        if rating is None or rating == 0:
+            unrated_count += 1
+        if rating is None:
+            continue
+        rated_count += 1
+        rating_sum += rating
+        if min_rating is None or rating < min_rating:
+            min_rating = rating
+    return rated_count, unrated_count, rating_sum, min_rating
+
+
+def _filtered_stats(items: tuple[Track, ...]) -> tuple[int, float, float, float, tuple[int, int, int, int]]:
+    """Single pass over tracks that survive the duration filter.
+
+    Callers must have already rejected albums with unrated tracks.
+    Returns (count, rating sum, lowest, highest, (excellent, very good, below average, poor) counts).
+    """
+    count = excellent = very_good = below_average = poor = 0
+    rating_sum = 0.0
+    lowest, highest = 11.0, -1.0
+    for track in items:
+        r, duration = track.rating, track.duration
+        assert r is not None, "unrated tracks must be rejected before filtering"
+        if (duration < 60 and r < 3) or duration < 30:
+            continue
+        count += 1
+        rating_sum += r
+        lowest = r if r < lowest else lowest
+        highest = r if r > highest else highest
+        if r >= 9:
+            excellent += 1
+        elif r >= 7:
+            very_good += 1
+        elif r >= 6:
+            pass  # average tier carries no adjustment
+        elif r >= 4:
+            below_average += 1
+        else:
+            poor += 1
+    return count, rating_sum, lowest, highest, (excellent, very_good, below_average, poor)
 
 
 # Function to update album rating
 def update_album_rating(album_key: str, rating: int) -> bool:
     # Ensure rating is within Plex's 0-10 scale
     plex_rating = max(0, min(10, rating))
-    url = f"{PLEX_URL}/library/sections/{MUSIC_LIBRARY_ID}/all"
-    headers = {"X-Plex-Token": PLEX_TOKEN, "Accept": "application/json"}
     params = {
         "type": 9,  # Type 9 is for albums
         "id": album_key,
         "userRating.value": plex_rating,
     }
-    response = requests.put(url, headers=headers, params=params)
+    response = _session().put(_endpoints()["section_all"], params=params)
     return response.status_code == 200
 
 
-def get_filtered_tracks(tracks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def get_filtered_tracks(tracks: List[Track]) -> List[Track]:
     """Get tracks filtered by duration and rating criteria."""
-    return [track for track in tracks if not (track.get("duration", 0) < 60 and track.get("rating", 0) < 3) and not track.get("duration", 0) < 30]
-
+    return [track for track in tracks if not (track.duration < 60 and (track.rating or 0) < 3) and not track.duration < 30]
 
-def get_track_stats(tracks: List[Dict[str, Any]]) -> tuple[List[int], Optional[float], Optional[int], Optional[int]]:
-    """Calculate track rating statistics. Returns (ratings, avg, min, max)."""
-    ratings = [t["rating"] for t in tracks if t["rating"] is not None]
-    if not ratings:
-        return ratings, None, None, None
-    return ratings, sum(ratings) / len(ratings), min(ratings), max(ratings)
 
-
-def create_result_dict(album: Dict[str, str], rating: Optional[int], skip_reason: Optional[str] = None) -> Dict[str, Any]:
+def create_result_dict(album: Album, rating: Optional[int], skip_reason: Optional[str] = None) -> Dict[str, Any]:
     """Create the base result dictionary."""
     result = {
-        "Artist": album["artist"],
-        "Album": album["title"],
+        "Artist": album.artist,
+        "Album": album.title,
         "Rating": rating,
         "Status": "Skipped" if rating is None else "Preview",
         "Rating Adjustment": None,
@@ -164,21 +377,43 @@ def create_result_dict(album: Dict[str, str], rating: Optional[int], skip_reason
     return result
 
 
-def update_progress(current: int, total: int, stats: Dict[str, int]) -> None:
+def update_progress(current: int, total: int, stats: Dict[str, int], mode: str) -> None:
     """Update progress display in-place."""
-    processed = stats.get("Success", 0) + stats.get("Preview", 0)
     skipped = stats.get("Skipped", 0)
     failed = stats.get("Failed", 0)
+    if mode == "update":
+        # Rated albums are only queued here; update_rating_progress reports the sent updates
+        counts = f"Queued: {stats.get('Preview', 0)}"
+    else:
+        counts = f"Updated: {stats.get('Success', 0) + stats.get('Preview', 0)}"
 
-    print(f"\rProcessed: {current}/{total} | Updated: {processed} | Skipped: {skipped} | Failed: {failed}", end="")
+    print(f"\rProcessed: {current}/{total} | {counts} | Skipped: {skipped} | Failed: {failed}", end="")
+
+
+def update_rating_progress(current: int, total: int, stats: Dict[str, int]) -> None:
+    """Update rating update progress display in-place."""
+    print(f"\rUpdating: {current}/{total} | Succeeded: {stats.get('Success', 0)} | Failed: {stats.get('Failed', 0)}", end="")
 
 
 def round_half_up(n: float, decimals: int = 0) -> float:
     """Round a number using "half up" strategy instead of banker's rounding."""
-    multiplier = 10**decimals
+    if decimals == 0 and n >= 0:
+        return int(n + 0.5)  # Truncation equals floor for non-negative values
+    multiplier = _POW10[decimals] if 0 <= decimals < len(_POW10) else 10**decimals
     return math.floor(n * multiplier + 0.5) / multiplier
 
 
+def get_args() -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Calculate Plex album ratings from track ratings.")
+    parser.add_argument(
+        "--use-cache",
+        action="store_true",
+        help="In preview mode, store fetched tracks on disk and reuse them for albums whose updatedAt is unchanged. Track rating edits since the last run may not be reflected.",
+    )
+    return parser.parse_args()
+
+
 def get_mode() -> str:
     """Get execution mode from user input."""
     while True:
@@ -188,71 +423,51 @@ def get_mode() -> str:
         print("Invalid mode. Please enter 'preview' (p) or 'update' (u)")
 
 
-def process_album(album: Dict[str, Any], mode: str, stats: Dict[str, int]) -> Dict[str, Any]:
+def process_album(album: Album, tracks: List[Track], stats: Dict[str, int]) -> Dict[str, Any]:
     """Process a single album and return its result."""
-    if album.get("userRating") is not None:
+    if album.user_rating is not None:
         result = create_result_dict(album, None, "Album already rated")
         stats["Skipped"] = stats.get("Skipped", 0) + 1
         return result
 
-    tracks = get_album_tracks(album["key"])
-    rating, skip_reason = calculate_album_rating(tracks)
+    rating, skip_reason, filtered_stats = calculate_album_rating(tracks)
     result = create_result_dict(album, rating, skip_reason)
 
-    if rating is not None:
-        filtered_tracks = get_filtered_tracks(tracks)
-        filtered_ratings, filtered_avg, lowest, highest = get_track_stats(filtered_tracks)
-
-        if filtered_avg is not None:
-            result.update(
-                {
-                    "Rating Adjustment": round_half_up(abs(rating - filtered_avg), 2),
-                    "Avg Rating": round_half_up(filtered_avg, 2),
-                    "Lowest Track": lowest,
-                    "Highest Track": highest,
-                }
-            )
-
-        if mode == "update":
-            success = update_album_rating(album["key"], rating)
-            result["Status"] = "Success" if success else "Failed"
+    if rating is not None and filtered_stats is not None:
+        filtered_avg, lowest, highest = filtered_stats
+        result.update(
+            {
+                "Rating Adjustment": round_half_up(abs(rating - filtered_avg), 2),
+                "Avg Rating": round_half_up(filtered_avg, 2),
+                "Lowest Track": lowest,
+                "Highest Track": highest,
+            }
+        )
 
     stats[result["Status"]] = stats.get(result["Status"], 0) + 1
     return result
 
 
-def save_results(results: List[Dict[str, Any]], mode: str) -> str:
-    """Save results to CSV and return output filename."""
-    results_df = pd.DataFrame(results)
-    output_file = f"plex_album_ratings_{mode}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
-    results_df.to_csv(output_file, index=False)
-    return output_file
+def get_output_file(mode: str) -> str:
+    """Return the results CSV filename for this run."""
+    return f"plex_album_ratings_{mode}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
 
 
-def print_summary(results: List[Dict[str, Any]], mode: str) -> None:
+def print_summary(stats: Dict[str, int], total: int, mode: str) -> None:
     """Print processing summary."""
-    total = len(results)
+    print("\nSummary:")
+    print(f"Total albums processed: {total}")
     if mode == "update":
-        updated = sum(1 for r in results if r["Status"] == "Success")
-        skipped = sum(1 for r in results if r["Status"] == "Skipped")
-        failed = sum(1 for r in results if r["Status"] == "Failed")
-
-        print("\nSummary:")
-        print(f"Total albums processed: {total}")
-        print(f"Successfully updated: {updated}")
-        print(f"Skipped: {skipped}")
-        print(f"Failed: {failed}")
+        print(f"Successfully updated: {stats.get('Success', 0)}")
+        print(f"Skipped: {stats.get('Skipped', 0)}")
+        print(f"Failed: {stats.get('Failed', 0)}")
     else:
-        processed = sum(1 for r in results if r["Status"] == "Preview")
-        skipped = sum(1 for r in results if r["Status"] == "Skipped")
-
-        print("\nSummary:")
-        print(f"Total albums processed: {total}")
-        print(f"Ratings calculated: {processed}")
-        print(f"Skipped: {skipped}")
+        print(f"Ratings calculated: {stats.get('Preview', 0)}")
+        print(f"Skipped: {stats.get('Skipped', 0)}")
 
 
 def main() -> None:
+    args = get_args()
     mode = get_mode()
     print(f"\nRunning in {mode.upper()} mode")
 
@@ -260,21 +475,53 @@ def main() -> None:
     albums = get_all_albums()
     print(f"Found {len(albums)} albums")
 
-    results = []
     stats = {"Preview": 0, "Success": 0, "Failed": 0, "Skipped": 0}
 
+    print("Fetching tracks from Plex...")
+    # Track rating edits may not bump the album's updatedAt, so the cache is opt-in and never used for updates
+    if args.use_cache and mode == "update":
+        print("Ignoring --use-cache in update mode")
+    tracks_by_album, cached_count = get_tracks_for_albums(albums, use_cache=args.use_cache and mode == "preview")
+    if cached_count:
+        print(f"Using cached tracks for {cached_count} albums; track rating changes since the last run may not be reflected")
+
     print("Processing albums...")
-    for i, album in enumerate(albums, 1):
-        result = process_album(album, mode, stats)
-        results.append(result)
-        update_progress(i, len(albums), stats)
-        time.sleep(0.1)
+    output_file = get_output_file(mode)
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        # Update mode holds rows until their updates resolve so the CSV stays in album order
+        rows = []
+        updates = []
+        for i, album in enumerate(albums, 1):
+            result = process_album(album, tracks_by_album.get(album.key, []), stats)
+            if mode == "update":
+                rows.append(result)
+                if result["Rating"] is not None:
+                    updates.append((album, result))
+            else:
+                writer.writerow(result)
+            update_progress(i, len(albums), stats, mode)
+
+        if updates:
+            print("\nUpdating album ratings...")
+            with ThreadPoolExecutor(max_workers=UPDATE_WORKERS) as executor:
+                successes = executor.map(lambda update: update_album_rating(update[0].key, update[1]["Rating"]), updates)
+                for i, ((_, result), success) in enumerate(zip(updates, successes, strict=True), 1):
+                    # Rated albums are counted as Preview until their update completes
+                    result["Status"] = "Success" if success else "Failed"
+                    stats["Preview"] -= 1
+                    stats[result["Status"]] += 1
+                    update_rating_progress(i, len(updates), stats)
+
+        writer.writerows(rows)
 
     print("\nDone!")
 
-    output_file = save_results(results, mode)
-    print_summary(results, mode)
+    print_summary(stats, len(albums), mode)
     print(f"Results saved to {output_file}")
+    if cached_count:
+        print(f"Note: {cached_count} albums were rated from cached tracks; rerun without --use-cache for current track ratings")
 
 
 if __name__ == "__main__":